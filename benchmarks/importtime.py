@@ -0,0 +1,89 @@
+"""
+Benchmark the import time of the pipeline per stage
+
+Each stage is imported in a fresh interpreter with '-X importtime' in
+the same way as it is loaded when it runs. The benchmark fails if a
+stage imports a module it does not need, which would slow down the cold
+start of the Cloud Functions.
+
+Usage
+-----
+python benchmarks/importtime.py
+"""
+
+import subprocess
+import sys
+
+# Statement to import each stage and the modules it must not import.
+# Note that pandas itself imports pytz, and pyarrow if it is installed
+STAGES = dict(
+    weather=(
+        "from pipeline import Database, weather",
+        ["bs4", "pyarrow", "pipeline.airports", "pipeline.cities", "pipeline.flights"],
+    ),
+    flights=(
+        "from pipeline import Database, flights",
+        ["bs4", "pyarrow", "pipeline.airports", "pipeline.cities", "pipeline.weather"],
+    ),
+    cities=(
+        "from pipeline import Database, airports, cities",
+        ["pyarrow", "pipeline.flights", "pipeline.weather"],
+    ),
+)
+
+
+def importtime(statement):
+    """
+    Import modules in a fresh interpreter and measure the import time
+
+    Parameters
+    ----------
+    statement : str
+        Python statement to execute
+
+    Returns
+    -------
+    modules : dict
+        Cumulative import time in microseconds per imported module. Only
+        modules that were imported successfully are included
+    """
+    # Print the loaded modules, since failed imports are timed as well
+    statement += "; import sys; print(*sys.modules, sep='\\n')"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines are formatted as 'import time: self | cumulative | module'
+    loaded = set(result.stdout.splitlines())
+    modules = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if module.strip() in loaded:
+            modules[module.strip()] = int(cumulative)
+    return modules
+
+
+def main():
+    failed = False
+    for stage, (statement, excluded) in STAGES.items():
+        modules = importtime(statement)
+        total = modules.get("pipeline", 0) + modules.get("pipeline.database", 0)
+        total += modules.get(f"pipeline.{stage}", 0)
+        print(f"{stage}: {total / 1000:.1f} ms ({len(modules)} modules)")
+
+        # Check for unnecessary modules and their submodules
+        for name in excluded:
+            if any(module == name or module.startswith(f"{name}.") for module in modules):
+                print(f"  {stage} imports '{name}' unnecessarily")
+                failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,5 +5,20 @@ for cities worldwide
 
 __all__ = ["Database", "airports", "cities", "flights", "weather"]
 
-from . import airports, cities, flights, weather
-from .database import Database
+import importlib
+
+
+def __getattr__(name):
+    """
+    Import the submodules and the Database class on first access
+
+    Each pipeline stage has its own dependencies. Importing them lazily
+    keeps the start-up time of a process low that only runs one stage.
+    """
+    if name == "Database":
+        from .database import Database
+
+        return Database
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
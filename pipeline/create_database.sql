@@ -23,7 +23,8 @@ CREATE TABLE cities (
     city_id INT AUTO_INCREMENT,
     city_name VARCHAR(255),
     country_code VARCHAR(10),
-    PRIMARY KEY (city_id)
+    PRIMARY KEY (city_id),
+    INDEX (city_name)
 );
 
 -- Static information about geographical locations
@@ -55,11 +56,19 @@ CREATE TABLE population (
     FOREIGN KEY (city_id) REFERENCES cities(city_id)
 );
 
+-- Lookup of the recurring weather outlook descriptions
+CREATE TABLE outlooks (
+    outlook_id SMALLINT AUTO_INCREMENT,
+    outlook VARCHAR(255) NOT NULL,
+    PRIMARY KEY (outlook_id),
+    UNIQUE (outlook)
+);
+
 -- Dynamic information about weather
 CREATE TABLE weather (
     weather_id INT AUTO_INCREMENT,
     city_id INT NOT NULL,
-    outlook VARCHAR(255),
+    outlook_id SMALLINT,
 	forecast_time DATETIME,
     temperature FLOAT,
     feels_like FLOAT,
@@ -68,7 +77,9 @@ CREATE TABLE weather (
     rain_in_last_3h FLOAT,
     weather_retrieved_at DATETIME,
     PRIMARY KEY (weather_id),
-    FOREIGN KEY (city_id) REFERENCES cities(city_id)
+    INDEX (weather_retrieved_at),
+    FOREIGN KEY (city_id) REFERENCES cities(city_id),
+    FOREIGN KEY (outlook_id) REFERENCES outlooks(outlook_id)
 );
 
 -- Dynamic information about incoming flights
@@ -80,5 +91,44 @@ CREATE TABLE flights (
     arrival_time DATETIME,
     flight_retrieved_at DATETIME,
     PRIMARY KEY (flight_id),
+    INDEX (flight_retrieved_at),
+    FOREIGN KEY (arrival_icao) REFERENCES airports(icao)
+);
+
+-- Marketing flight numbers of codeshared incoming flights
+CREATE TABLE codeshares (
+    codeshare_id INT AUTO_INCREMENT,
+    flight_num VARCHAR(25),
+    departure_icao VARCHAR(25),
+    arrival_icao VARCHAR(25),
+    arrival_time DATETIME,
+    PRIMARY KEY (codeshare_id),
+    INDEX (arrival_icao, arrival_time),
     FOREIGN KEY (arrival_icao) REFERENCES airports(icao)
-)
+);
+
+-- Bookkeeping of completed flight retrievals per airport and time slot
+CREATE TABLE flight_checkpoints (
+    icao VARCHAR(10),
+    slot_start DATETIME,
+    slot_end DATETIME,
+    arrivals INT,
+    completed_at DATETIME,
+    PRIMARY KEY (icao, slot_start),
+    FOREIGN KEY (icao) REFERENCES airports(icao)
+);
+
+-- Summary of expected arrivals and weather forecast per city and hour
+CREATE TABLE demand (
+    city_id INT,
+    demand_hour DATETIME,
+    arrivals INT NOT NULL DEFAULT 0,
+    outlook_id SMALLINT,
+    temperature FLOAT,
+    feels_like FLOAT,
+    wind_speed FLOAT,
+    rain_prob FLOAT,
+    PRIMARY KEY (city_id, demand_hour),
+    FOREIGN KEY (city_id) REFERENCES cities(city_id),
+    FOREIGN KEY (outlook_id) REFERENCES outlooks(outlook_id)
+)
\ No newline at end of file
@@ -20,17 +20,31 @@ Fetch dynamic data and update it in the database
 >>> db.fetch_weather()
 >>> db.fetch_flights()
 
+Backfill the flight data for a range of dates (resumable)
+>>> db.backfill_flights('2024-05-01', '2024-05-31')
+
+Read the expected arrivals and weather per city and hour
+>>> db.read_demand(['Berlin'], start='2024-05-01', end='2024-05-02')
+
+Export the new weather and flights data for analytics
+>>> db.export_parquet('exports')
+
 For more information, see the **usage** documentation.
 """
 
 __all__ = ["Database"]
 
+import os
+import re
+import warnings
 from importlib import resources as pkg_resources
 
 import mysql.connector
 import pandas as pd
+import sqlalchemy
 
-from . import airports, cities, flights, weather
+# The pipeline stages are imported on first use, so that each stage
+# only loads the dependencies it needs
 
 
 class Database:
@@ -87,6 +101,7 @@ class Database:
             **connection, protocol="mysql+pymysql"
         )
         self.update_parameters = dict(con=self.connection_string, if_exists="append", index=False)
+        self.engine = sqlalchemy.create_engine(self.connection_string)
         self.setup(reset)
 
     def setup(self, reset=False):
@@ -107,8 +122,14 @@ class Database:
                 if err.errno != mysql.connector.errorcode.ER_BAD_DB_ERROR:
                     raise
             else:
-                # It exists, so there is nothing to do here
+                # It exists, so it only needs to be brought up-to-date. The
+                # table 'demand' is created last by the migration
+                with cnx.cursor() as cursor:
+                    cursor.execute("SHOW TABLES LIKE 'demand'")
+                    migrated = cursor.fetchone() is not None
                 cnx.close()
+                if not migrated:
+                    self.migrate()
                 return
 
         # Connect to the MySQL server
@@ -117,64 +138,205 @@ class Database:
         with mysql.connector.connect(**connection) as cnx:
 
             # Read query from file
-            with pkg_resources.open_text(__package__, "create_database.sql") as f:
-                content = f.read()
-                content = content.replace("gans_cities", db_name)
-                queries = content.split(";")
+            queries = read_schema(db_name)
 
             # Execute the queries to create the database and tables
             with cnx.cursor() as cursor:
                 for query in queries:
                     cursor.execute(query)
 
+    def migrate(self):
+        """
+        Upgrade an existing database to the current schema
+
+        Missing tables, columns, and indexes are added without losing
+        any data. Running it on an up-to-date database has no effect. The
+        table 'demand' is created last, so that its existence marks the
+        migration as complete.
+
+        Notes
+        -----
+        Databases created before the 'outlooks' lookup table existed
+        store the outlook descriptions in the 'weather' table. These are
+        moved to the lookup table and replaced by their IDs.
+
+        The summary in the 'demand' table only covers data that is added
+        after it was created. To summarize the existing data, run
+        `rebuild_demand` once after the migration. This is not done here,
+        as it may take long and the migration runs on start-up.
+
+        Warns
+        -----
+        UserWarning
+            If the 'demand' table is created while data already exists
+        """
+        with mysql.connector.connect(**self.connection) as cnx:
+            with cnx.cursor() as cursor:
+                # Get the existing tables, columns, and indexed columns
+                cursor.execute(
+                    "SELECT table_name, column_name FROM information_schema.columns "
+                    "WHERE table_schema = DATABASE()"
+                )
+                columns = set(cursor.fetchall())
+                tables = {table for table, _ in columns}
+                cursor.execute(
+                    "SELECT table_name, column_name FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND seq_in_index = 1"
+                )
+                indexes = set(cursor.fetchall())
+
+                # Create the missing tables in the order of the schema,
+                # except for the table that marks the migration as complete
+                created = []
+                for query in read_schema(self.connection["database"]):
+                    match = re.search(r"CREATE TABLE (\w+)", query)
+                    if match and match.group(1) not in tables:
+                        if match.group(1) == "demand":
+                            marker = query
+                            continue
+                        cursor.execute(query)
+                        created.append(match.group(1))
+
+                # Tables created above already match the schema, so only
+                # previously existing tables are altered below
+                tables -= set(created)
+
+                # Replace the outlook descriptions by the lookup IDs
+                if "weather" in tables and ("weather", "outlook_id") not in columns:
+                    cursor.execute(
+                        "ALTER TABLE weather ADD COLUMN outlook_id SMALLINT AFTER city_id, "
+                        "ADD FOREIGN KEY (outlook_id) REFERENCES outlooks(outlook_id)"
+                    )
+                if ("weather", "outlook") in columns:
+                    cursor.execute(
+                        "INSERT IGNORE INTO outlooks (outlook) "
+                        "SELECT DISTINCT outlook FROM weather WHERE outlook IS NOT NULL"
+                    )
+                    cursor.execute(
+                        "UPDATE weather w JOIN outlooks o ON w.outlook = o.outlook "
+                        "SET w.outlook_id = o.outlook_id"
+                    )
+                    cnx.commit()
+                    cursor.execute("ALTER TABLE weather DROP COLUMN outlook")
+
+                # Add the columns of tables that were extended later
+                if "flight_checkpoints" in tables:
+                    if ("flight_checkpoints", "arrivals") not in columns:
+                        cursor.execute(
+                            "ALTER TABLE flight_checkpoints ADD COLUMN arrivals INT AFTER slot_end"
+                        )
+
+                # Add the indexes of columns that are filtered on
+                for table, column in [
+                    ("cities", "city_name"),
+                    ("weather", "weather_retrieved_at"),
+                    ("flights", "flight_retrieved_at"),
+                ]:
+                    if table in tables and (table, column) not in indexes:
+                        cursor.execute(f"ALTER TABLE {table} ADD INDEX ({column})")
+
+                cnx.commit()
+                if "demand" not in tables:
+                    cursor.execute(marker)
+
+                    # Existing data is not summarized yet
+                    cursor.execute(
+                        "SELECT EXISTS(SELECT 1 FROM flights) OR EXISTS(SELECT 1 FROM weather)"
+                    )
+                    if cursor.fetchone()[0]:
+                        warnings.warn(
+                            "The table 'demand' does not summarize the existing data. "
+                            "Run Database.rebuild_demand() once to add it"
+                        )
+
     def add_cities(self, city_list):
         """
         Add cities to the database if they do not exist yet
 
+        The cities, their population, geo data, and airports are added in
+        one transaction. If any of it fails, none of it is added. Cities
+        for which no airports are found are not added either, so that
+        they are retried by the next call.
+
         Parameters
         ----------
         city_list : list
             List of cities to add to the database
 
+        Warns
+        -----
+        UserWarning
+            If no airports are found for a city
+
         See also
         --------
         cities.scrape : Web scraping city data
+        airports.find : Finding airports of cities
         """
+        from . import airports, cities
+
         # Remove existing cities from query
-        existing_cities = pd.read_sql("cities", con=self.connection_string)["city_name"].unique()
-        city_list = list(set(city_list) - set(existing_cities))
+        city_list = list(set(city_list))
+        query = sqlalchemy.text(
+            "SELECT city_name FROM cities WHERE city_name IN :city_names"
+        ).bindparams(sqlalchemy.bindparam("city_names", expanding=True))
+        with self.engine.connect() as con:
+            existing_cities = pd.read_sql(query, con=con, params=dict(city_names=city_list))
+        city_list = list(set(city_list) - set(existing_cities.city_name))
         if len(city_list) == 0:
             return
 
         # Scrape the web for city data
         retrieved = cities.scrape(city_list)
+        if len(retrieved) == 0:
+            return
 
-        # Add the new cities to the cities table in the database
-        retrieved[["city_name", "country_code"]].to_sql("cities", **self.update_parameters)
-        cities_db = pd.read_sql("cities", con=self.connection_string)
-
-        # Merge the new population and geo data
-        retr_full = cities_db.merge(retrieved)
-        population = retr_full[["city_id", "population", "timestamp_population"]]
-        geo = retr_full[["city_id", "latitude", "longitude", "timezone"]]
+        # Get the airports in proximity to the new cities
+        retrieved_airports = airports.find(
+            retrieved.latitude, retrieved.longitude, self.rapid_api_key
+        )
 
-        # Add the new data to the database
-        population.to_sql("population", **self.update_parameters)
-        geo.to_sql("geo", **self.update_parameters)
+        # Skip cities without airports, e.g. due to a failed API call
+        has_airports = retrieved.index.isin(retrieved_airports.id)
+        for city in retrieved.city_name[~has_airports]:
+            warnings.warn(f"Skipping {city}: no airports found")
+        retrieved = retrieved[has_airports].copy()
+        if len(retrieved) == 0:
+            return
 
-        # Finally update the airports too
-        self.add_airports()
+        with self.engine.begin() as con:
+            # Add the new cities one by one to obtain their generated IDs
+            insert = sqlalchemy.text(
+                "INSERT INTO cities (city_name, country_code) "
+                "VALUES (:city_name, :country_code)"
+            )
+            retrieved["city_id"] = [
+                con.execute(insert, row).lastrowid
+                for row in retrieved[["city_name", "country_code"]].to_dict("records")
+            ]
+
+            # Add the new population and geo data
+            population = retrieved[["city_id", "population", "timestamp_population"]]
+            geo = retrieved[["city_id", "latitude", "longitude", "timezone"]]
+            population.to_sql("population", con=con, if_exists="append", index=False)
+            geo.to_sql("geo", con=con, if_exists="append", index=False)
+
+            # Finally add the airports too
+            airports_full = retrieved[["city_id"]].merge(
+                retrieved_airports, left_index=True, right_on="id"
+            )
+            self.insert_airports(airports_full.drop(columns="id"), con)
 
     def add_airports(self):
         """
         Add airports for all cities to the database if they do not exist
         yet
         """
-        # Get the cities geo data and existing airports from the
-        # database
+        from . import airports
+
+        # Get the cities geo data from the database
         geo_db = pd.read_sql("geo", con=self.connection_string)
         cities_id = geo_db[["city_id"]]
-        airports_db = pd.read_sql("airports", con=self.connection_string)
 
         # Get the airports in proximity to the cities
         retrieved = airports.find(geo_db.latitude, geo_db.longitude, self.rapid_api_key)
@@ -183,11 +345,34 @@ class Database:
         retrieved_full = cities_id.merge(retrieved, left_index=True, right_on="id")
         retrieved_full = retrieved_full.drop(columns="id")
 
-        # Exclude existing airports
-        airports_new = retrieved_full[~retrieved_full.icao.isin(airports_db.icao)]
+        with self.engine.begin() as con:
+            self.insert_airports(retrieved_full, con)
+
+    def insert_airports(self, airports_df, con):
+        """
+        Add airports to the database if they do not exist yet
+
+        Parameters
+        ----------
+        airports_df : pd.DataFrame
+            DataFrame with the columns 'city_id', 'icao', and
+            'airport_name'
+
+        con : sqlalchemy.engine.Connection
+            Open connection to use for reading and writing
+        """
+        # Exclude existing airports and airports shared by the cities
+        airports_df = airports_df.drop_duplicates(subset="icao")
+        if len(airports_df) == 0:
+            return
+        query = sqlalchemy.text("SELECT icao FROM airports WHERE icao IN :icaos").bindparams(
+            sqlalchemy.bindparam("icaos", expanding=True)
+        )
+        airports_db = pd.read_sql(query, con=con, params=dict(icaos=airports_df.icao.tolist()))
+        airports_new = airports_df[~airports_df.icao.isin(airports_db.icao)]
 
         # Add the new airports to the database
-        airports_new.to_sql("airports", **self.update_parameters)
+        airports_new.to_sql("airports", con=con, if_exists="append", index=False)
 
     def fetch_population(self):
         """
@@ -197,6 +382,8 @@ class Database:
         -----
         Only add rows that contain new data
         """
+        from . import cities
+
         # Get the cities from the database
         cities_db = pd.read_sql("cities", con=self.connection_string)
 
@@ -231,6 +418,8 @@ class Database:
         """
         Fetch the weather data for the cities in the database
         """
+        from . import weather
+
         # Get the cities geo data from the database
         geo_db = pd.read_sql("geo", con=self.connection_string)
         cities_id = geo_db[["city_id"]]
@@ -242,18 +431,590 @@ class Database:
         retrieved_full = cities_id.merge(retrieved, left_index=True, right_on="id")
         retrieved_full = retrieved_full.drop(columns="id")
 
-        # Add the weather data to the database
-        retrieved_full.to_sql("weather", **self.update_parameters)
+        with self.engine.begin() as con:
+            # Replace the outlook descriptions by their lookup IDs
+            outlook_ids = self.add_outlooks(retrieved_full.outlook, con)
+            retrieved_full = retrieved_full.merge(outlook_ids, how="left").drop(columns="outlook")
 
-    def fetch_flights(self):
+            # Add the weather data to the database and update the summary
+            retrieved_full.to_sql("weather", con=con, if_exists="append", index=False)
+            self.update_demand_weather(retrieved_full, con)
+
+    def add_outlooks(self, outlooks, con):
+        """
+        Add weather outlook descriptions to the lookup table if they do
+        not exist yet
+
+        Parameters
+        ----------
+        outlooks : pd.Series
+            Outlook descriptions, possibly repeated
+
+        con : sqlalchemy.engine.Connection
+            Open connection to use for reading and writing
+
+        Returns
+        -------
+        outlook_ids : pd.DataFrame
+            DataFrame with the columns 'outlook_id' and 'outlook' for all
+            outlooks in the lookup table
+        """
+        # The lookup table is small, so it is read entirely
+        outlooks_db = pd.read_sql("outlooks", con=con)
+        outlooks_new = pd.DataFrame(dict(outlook=pd.Series(outlooks).dropna().unique()))
+        outlooks_new = outlooks_new[~outlooks_new.outlook.isin(outlooks_db.outlook)]
+        if len(outlooks_new) == 0:
+            return outlooks_db
+
+        # Add the new outlooks and read back their generated IDs
+        outlooks_new.to_sql("outlooks", con=con, if_exists="append", index=False)
+        outlooks_db = pd.read_sql("outlooks", con=con)
+        return outlooks_db
+
+    def fetch_flights(self, codeshares=False):
         """
         Fetch the flight data for the airports in the database
+
+        Parameters
+        ----------
+        codeshares : bool
+            If True, the marketing flight numbers of codeshared flights
+            are stored in the table 'codeshares'. Default is False
+
+        Notes
+        -----
+        The flights of the following day are retrieved with
+        `backfill_flights`. Repeated calls on the same day only fetch
+        the time slots that have not been stored yet.
+        """
+        from . import flights
+
+        # Get the date of the following day based on operation timezone
+        date = flights.tomorrow(self.timezone)
+        self.backfill_flights(date, date, codeshares)
+
+    def backfill_flights(self, start, end, codeshares=False):
+        """
+        Fetch the flight data for the airports in the database for a
+        range of dates
+
+        Each airport and time slot is committed to the database together
+        with a checkpoint as soon as it is retrieved. Time slots that are
+        already checkpointed are skipped, so that an interrupted run can
+        be continued by calling this method again with the same range.
+
+        The number of time slots per day is adapted to the arrival volume
+        of each airport observed before the start of the range. Quiet
+        airports are fetched with the least number of requests and busy
+        ones in finer time slots.
+
+        Parameters
+        ----------
+        start : str or datetime.date
+            First date of the range (inclusive)
+
+        end : str or datetime.date
+            Last date of the range (inclusive)
+
+        codeshares : bool
+            If True, the marketing flight numbers of codeshared flights
+            are stored in the table 'codeshares'. Default is False
+
+        Notes
+        -----
+        Codeshared flights are always stored as one row per operating
+        flight in the table 'flights'.
+
+        See also
+        --------
+        flights.backfill : Fetching flight data per time slot
         """
-        # Get the airport ICAOs from the database
+        from . import flights
+
+        # Get the airport ICAOs and the completed time slots from the
+        # database
         icaos = pd.read_sql("airports", con=self.connection_string)["icao"]
+        checkpoints = pd.read_sql("flight_checkpoints", con=self.connection_string)
+        completed = zip(checkpoints.icao, checkpoints.slot_start, checkpoints.slot_end)
+
+        # Plan the time slots from the arrivals per day observed before
+        # the range, so that the plan is the same when resuming
+        history = checkpoints[
+            (checkpoints.slot_start < pd.Timestamp(start)) & checkpoints.arrivals.notna()
+        ]
+        length = history.slot_end - history.slot_start + pd.Timedelta(minutes=1)
+        hours = length / pd.Timedelta(hours=1)
+        arrivals_per_day = (
+            history.arrivals.groupby(history.icao).sum() / hours.groupby(history.icao).sum() * 24
+        )
+        windows = {icao: flights.plan_windows(rate) for icao, rate in arrivals_per_day.items()}
+
+        # Get the flights data one time slot at a time
+        for icao, (slot_start, slot_end), retrieved, marketing in flights.backfill(
+            icaos, self.rapid_api_key, start, end, completed, windows
+        ):
+            checkpoint = pd.DataFrame(
+                dict(
+                    icao=[icao],
+                    slot_start=[slot_start],
+                    slot_end=[slot_end],
+                    arrivals=[len(retrieved) + len(marketing)],
+                    completed_at=[pd.Timestamp.now(tz="UTC").tz_localize(None)],
+                )
+            )
+
+            # Add the flight data, the summary, and the checkpoint in one
+            # transaction
+            with self.engine.begin() as con:
+                retrieved.to_sql("flights", con=con, if_exists="append", index=False)
+                self.update_demand_arrivals(retrieved, con)
+                if codeshares:
+                    marketing.to_sql("codeshares", con=con, if_exists="append", index=False)
+                checkpoint.to_sql("flight_checkpoints", con=con, if_exists="append", index=False)
+
+    def update_demand_arrivals(self, arrivals, con):
+        """
+        Add new arrivals to the summary of arrivals and weather per city
+        and hour
+
+        Only the city-hours affected by the new rows are updated. The
+        arrivals are added to the existing counts.
+
+        Parameters
+        ----------
+        arrivals : pd.DataFrame
+            New rows of the 'flights' table
+
+        con : sqlalchemy.engine.Connection
+            Open connection to use for reading and writing
+        """
+        if len(arrivals) == 0:
+            return
+
+        # Find the cities of the arrival airports
+        query = sqlalchemy.text(
+            "SELECT icao AS arrival_icao, city_id FROM airports WHERE icao IN :icaos"
+        ).bindparams(sqlalchemy.bindparam("icaos", expanding=True))
+        icaos = arrivals.arrival_icao.astype(str).unique().tolist()
+        city_ids = pd.read_sql(query, con=con, params=dict(icaos=icaos))
+
+        # Count the arrivals per city and hour
+        arrivals_city = arrivals.astype(dict(arrival_icao=str)).merge(city_ids)
+        arrival_time = arrivals_city.arrival_time.dt.tz_convert(None)
+        arrivals_city["demand_hour"] = arrival_time.dt.floor("h")
+        counts = arrivals_city.groupby(["city_id", "demand_hour"]).size()
+        counts = counts.reset_index(name="arrivals")
+
+        counts.to_sql(
+            "demand",
+            con=con,
+            if_exists="append",
+            index=False,
+            method=upsert("arrivals = arrivals + VALUES(arrivals)"),
+        )
+
+    def update_demand_weather(self, forecasts, con):
+        """
+        Add new forecasts to the summary of arrivals and weather per city
+        and hour
+
+        Only the city-hours affected by the new rows are updated. The
+        forecasts replace the existing weather columns.
+
+        Parameters
+        ----------
+        forecasts : pd.DataFrame
+            New rows of the 'weather' table. Each forecast covers the
+            three hours starting at its forecast time
+
+        con : sqlalchemy.engine.Connection
+            Open connection to use for reading and writing
+        """
+        if len(forecasts) == 0:
+            return
 
-        # Get the flights data based on operation timezone
-        retrieved = flights.fetch(icaos, self.rapid_api_key, self.timezone)
+        # Spread the three-hourly forecasts over the hours they cover
+        columns = [
+            "city_id",
+            "outlook_id",
+            "temperature",
+            "feels_like",
+            "wind_speed",
+            "rain_prob",
+        ]
+        hourly = pd.concat(
+            [
+                forecasts[columns].assign(
+                    demand_hour=forecasts.forecast_time + pd.Timedelta(hours=hour)
+                )
+                for hour in range(3)
+            ],
+            ignore_index=True,
+        )
+        hourly = hourly.drop_duplicates(subset=["city_id", "demand_hour"], keep="last")
+
+        columns.remove("city_id")
+        hourly.to_sql(
+            "demand",
+            con=con,
+            if_exists="append",
+            index=False,
+            method=upsert(", ".join(f"{col} = VALUES({col})" for col in columns)),
+        )
+
+    def rebuild_demand(self, start=None, end=None):
+        """
+        Rebuild the summary of arrivals and weather per city and hour
+        from the 'flights' and 'weather' tables
+
+        Fetching new data keeps the summary up-to-date. Rebuilding it is
+        only necessary for data that was added otherwise, e.g. before the
+        summary existed.
+
+        Parameters
+        ----------
+        start : datetime-like, optional
+            First hour to rebuild (UTC, inclusive). By default, the
+            summary is rebuilt from the earliest data
+
+        end : datetime-like, optional
+            Last hour to rebuild (UTC, exclusive). By default, the summary
+            is rebuilt up to the latest data
+
+        Notes
+        -----
+        Codeshared and repeatedly fetched flights are only counted once,
+        as flights stored before codeshares were collapsed may contain
+        them. As in `flights.collapse_codeshares`, a flight is identified
+        by its departure airport, arrival airport, and arrival time.
+        """
+        # Hour of arrival and hours covered by a forecast
+        arrival_hour = "TIMESTAMP(DATE(f.arrival_time), MAKETIME(HOUR(f.arrival_time), 0, 0))"
+        forecast_hour = "w.forecast_time + INTERVAL h.shift HOUR"
+
+        conditions = dict(demand=["TRUE"], arrivals=["TRUE"], forecasts=["TRUE"], latest=["TRUE"])
+        params = dict()
+        if start is not None:
+            params["start"] = pd.Timestamp(start).floor("h").to_pydatetime()
+            conditions["demand"].append("demand_hour >= :start")
+            conditions["arrivals"].append("f.arrival_time >= :start")
+            conditions["forecasts"].append(f"{forecast_hour} >= :start")
+            conditions["latest"].append("forecast_time >= :start - INTERVAL 2 HOUR")
+        if end is not None:
+            params["end"] = pd.Timestamp(end).ceil("h").to_pydatetime()
+            conditions["demand"].append("demand_hour < :end")
+            conditions["arrivals"].append("f.arrival_time < :end")
+            conditions["forecasts"].append(f"{forecast_hour} < :end")
+            conditions["latest"].append("forecast_time < :end")
+        where = {name: " AND ".join(parts) for name, parts in conditions.items()}
+
+        queries = [
+            f"DELETE FROM demand WHERE {where['demand']}",
+            f"""
+            INSERT INTO demand (city_id, demand_hour, arrivals)
+            SELECT a.city_id, {arrival_hour} AS arrival_hour,
+                COUNT(
+                    DISTINCT COALESCE(f.departure_icao, f.flight_num),
+                    f.arrival_icao,
+                    f.arrival_time
+                )
+            FROM flights f JOIN airports a ON f.arrival_icao = a.icao
+            WHERE {where['arrivals']}
+            GROUP BY a.city_id, arrival_hour
+            """,
+            f"""
+            INSERT INTO demand (
+                city_id, demand_hour, outlook_id, temperature, feels_like, wind_speed, rain_prob
+            )
+            SELECT w.city_id, {forecast_hour}, w.outlook_id, w.temperature,
+                w.feels_like, w.wind_speed, w.rain_prob
+            FROM weather w
+            JOIN (
+                SELECT city_id, forecast_time, MAX(weather_retrieved_at) AS latest
+                FROM weather
+                WHERE {where['latest']}
+                GROUP BY city_id, forecast_time
+            ) l ON w.city_id = l.city_id AND w.forecast_time = l.forecast_time
+                AND w.weather_retrieved_at = l.latest
+            CROSS JOIN (SELECT 0 AS shift UNION ALL SELECT 1 UNION ALL SELECT 2) h
+            WHERE {where['forecasts']}
+            ON DUPLICATE KEY UPDATE outlook_id = VALUES(outlook_id),
+                temperature = VALUES(temperature), feels_like = VALUES(feels_like),
+                wind_speed = VALUES(wind_speed), rain_prob = VALUES(rain_prob)
+            """,
+        ]
+
+        # Replace the summary of the range in one transaction
+        with self.engine.begin() as con:
+            for query in queries:
+                con.execute(sqlalchemy.text(query), params)
+
+    def read_demand(self, city_names=None, start=None, end=None):
+        """
+        Read the expected arrivals and weather per city and hour
 
-        # Add the flight data to the database
-        retrieved.to_sql("flights", **self.update_parameters)
+        Parameters
+        ----------
+        city_names : list, optional
+            Names of the cities to read. By default, all cities are read
+
+        start : datetime-like, optional
+            First hour to read (UTC, inclusive)
+
+        end : datetime-like, optional
+            Last hour to read (UTC, exclusive)
+
+        Returns
+        -------
+        demand : pd.DataFrame
+            DataFrame with the columns 'city_id', 'city_name',
+            'demand_hour', 'arrivals', 'outlook', 'temperature',
+            'feels_like', 'wind_speed', and 'rain_prob'
+        """
+        conditions = ["TRUE"]
+        params = dict()
+        if city_names is not None:
+            conditions.append("c.city_name IN :city_names")
+            params["city_names"] = list(city_names)
+        if start is not None:
+            conditions.append("d.demand_hour >= :start")
+            params["start"] = pd.Timestamp(start).to_pydatetime()
+        if end is not None:
+            conditions.append("d.demand_hour < :end")
+            params["end"] = pd.Timestamp(end).to_pydatetime()
+
+        where = " AND ".join(conditions)
+        query = f"""
+            SELECT d.city_id, c.city_name, d.demand_hour, d.arrivals, o.outlook,
+                d.temperature, d.feels_like, d.wind_speed, d.rain_prob
+            FROM demand d
+            JOIN cities c ON d.city_id = c.city_id
+            LEFT JOIN outlooks o ON d.outlook_id = o.outlook_id
+            WHERE {where}
+            ORDER BY d.city_id, d.demand_hour
+            """
+        query = sqlalchemy.text(query)
+        if city_names is not None:
+            query = query.bindparams(sqlalchemy.bindparam("city_names", expanding=True))
+
+        with self.engine.connect() as con:
+            demand = pd.read_sql(query, con=con, params=params)
+        return demand
+
+    def export_parquet(self, path, since=None, chunksize=100_000):
+        """
+        Export new weather and flights data to Parquet files
+
+        The rows are streamed from the database in chunks and written to
+        one Parquet dataset per table, partitioned by the date of
+        retrieval. Each call only exports the rows inserted after the
+        watermark, so that repeated calls append to the datasets
+        incrementally.
+
+        Parameters
+        ----------
+        path : str
+            Directory in which to create the datasets 'weather' and
+            'flights'
+
+        since : datetime-like, optional
+            Export all rows retrieved at or after this time (UTC),
+            regardless of the existing datasets. By default, only the
+            rows with a primary key above the highest one already present
+            in the respective dataset are exported, or all rows if it is
+            empty
+
+        chunksize : int
+            Number of rows to load into memory and write at a time.
+            Default is 100,000
+
+        Returns
+        -------
+        watermarks : dict
+            Highest exported primary key per table, or None if the table
+            has no rows after the watermark
+
+        Raises
+        ------
+        ImportError
+            If the Python package `pyarrow` is not installed
+
+        Notes
+        -----
+        Requires the Python package `pyarrow`, which is not installed with
+        the requirements of the pipeline to keep its start-up fast. Install
+        it with the extra 'export' of this package.
+
+        The datasets are hive-partitioned by the column 'retrieved_date'
+        and contain the min/max statistics of each row group, so that they
+        can be filtered efficiently, e.g. with the argument 'filters' of
+        `pd.read_parquet`.
+
+        The primary key serves as watermark, because it increases in the
+        order of insertion. Unlike the retrieval time, it is unique and
+        also covers rows that are committed later than they were
+        retrieved. Only rows of transactions that are still open during
+        the export may be missed.
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as err:
+            raise ImportError(
+                "Exporting to Parquet requires the package 'pyarrow'. "
+                "Install it with 'pip install -e .[export]'"
+            ) from err
+
+        # Queries per table with their primary key and retrieval time
+        queries = dict(
+            weather=(
+                "weather_id",
+                "weather_retrieved_at",
+                """
+                SELECT w.weather_id, w.city_id, o.outlook, w.forecast_time,
+                    w.temperature, w.feels_like, w.wind_speed, w.rain_prob,
+                    w.rain_in_last_3h, w.weather_retrieved_at
+                FROM weather w LEFT JOIN outlooks o ON w.outlook_id = o.outlook_id
+                WHERE w.weather_id > :since_id AND w.weather_retrieved_at >= :since
+                ORDER BY w.weather_id
+                """,
+            ),
+            flights=(
+                "flight_id",
+                "flight_retrieved_at",
+                """
+                SELECT * FROM flights
+                WHERE flight_id > :since_id AND flight_retrieved_at >= :since
+                ORDER BY flight_id
+                """,
+            ),
+        )
+
+        # Lower bound of the retrieval time if given
+        table_since = pd.Timestamp(0 if since is None else since)
+        if table_since.tz is not None:
+            table_since = table_since.tz_convert("UTC").tz_localize(None)
+
+        watermarks = dict()
+        for table, (key, retrieved_at, query) in queries.items():
+            table_path = os.path.join(path, table)
+            since_id = 0
+            if since is None:
+                since_id = parquet_watermark(table_path, key) or 0
+
+            # Unique file names per call to never overwrite earlier exports
+            stamp = pd.Timestamp.now(tz="UTC").strftime("%Y%m%dT%H%M%S%f")
+            watermarks[table] = None
+
+            # Stream the query results with a server-side cursor
+            with self.engine.connect().execution_options(stream_results=True) as con:
+                chunks = pd.read_sql(
+                    sqlalchemy.text(query),
+                    con=con,
+                    params=dict(since_id=int(since_id), since=table_since.to_pydatetime()),
+                    chunksize=chunksize,
+                )
+                for i, chunk in enumerate(chunks):
+                    if table == "weather":
+                        chunk.outlook = chunk.outlook.astype("category")
+                    chunk["retrieved_date"] = chunk[retrieved_at].dt.strftime("%Y-%m-%d")
+                    chunk.to_parquet(
+                        table_path,
+                        partition_cols=["retrieved_date"],
+                        basename_template=f"{table}-{stamp}-{i}-{{i}}.parquet",
+                        index=False,
+                    )
+                    watermarks[table] = int(chunk[key].max())
+
+        return watermarks
+
+
+def read_schema(db_name):
+    """
+    Read the queries to create the database and its tables
+
+    Parameters
+    ----------
+    db_name : str
+        Name of the database
+
+    Returns
+    -------
+    queries : list
+        SQL queries in the order of execution
+    """
+    with pkg_resources.open_text(__package__, "create_database.sql") as f:
+        content = f.read()
+        content = content.replace("gans_cities", db_name)
+        queries = content.split(";")
+    return queries
+
+
+def upsert(update):
+    """
+    Create an insertion method for `pd.DataFrame.to_sql` that updates
+    existing rows
+
+    Parameters
+    ----------
+    update : str
+        Assignments of the MySQL clause 'ON DUPLICATE KEY UPDATE'
+
+    Returns
+    -------
+    method : callable
+        Insertion method to pass as 'method' to `pd.DataFrame.to_sql`
+    """
+
+    def method(table, con, keys, data_iter):
+        columns = ", ".join(keys)
+        values = ", ".join(f":{key}" for key in keys)
+        query = sqlalchemy.text(
+            f"INSERT INTO {table.name} ({columns}) VALUES ({values}) "
+            f"ON DUPLICATE KEY UPDATE {update}"
+        )
+        result = con.execute(query, [dict(zip(keys, row)) for row in data_iter])
+        return result.rowcount
+
+    return method
+
+
+def parquet_watermark(path, column):
+    """
+    Get the highest value of a column in a Parquet dataset
+
+    Only the row group statistics are read, not the data itself.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the Parquet dataset
+
+    column : str
+        Name of the column
+
+    Returns
+    -------
+    watermark : object or None
+        Maximum value of the column, or None if the dataset does not
+        exist or is empty
+    """
+    import pyarrow.parquet as pq
+
+    if not os.path.isdir(path):
+        return None
+
+    watermark = None
+    for root, _, files in os.walk(path):
+        for file in files:
+            if not file.endswith(".parquet"):
+                continue
+            metadata = pq.ParquetFile(os.path.join(root, file)).metadata
+            idx = metadata.schema.names.index(column)
+            for i in range(metadata.num_row_groups):
+                statistics = metadata.row_group(i).column(idx).statistics
+                if statistics is None or not statistics.has_min_max:
+                    continue
+                value = statistics.max
+                if watermark is None or value > watermark:
+                    watermark = value
+    return watermark
@@ -1,9 +1,19 @@
 """
 Make API calls to RapidAPI to fetch incoming flights of cities worldwide
-for the next full day
+for the next full day or for a range of past and future dates
 """
 
-__all__ = ["fetch"]
+__all__ = [
+    "fetch",
+    "backfill",
+    "fetch_slot",
+    "fetch_window",
+    "collapse_codeshares",
+    "plan_windows",
+    "time_slots",
+    "uncovered",
+    "tomorrow",
+]
 
 import warnings
 from datetime import datetime, timedelta
@@ -12,6 +22,21 @@ import pandas as pd
 import requests
 from pytz import timezone as tz
 
+URL_BASE = "https://aerodatabox.p.rapidapi.com/flights/airports/icao"
+
+# Longest time window accepted by the API
+MAX_WINDOW_HOURS = 12
+
+# Number of arrivals per response from which it may be incomplete
+MAX_ARRIVALS = 300
+
+# Compact data types of the repetitive string columns
+DTYPES = dict(
+    flight_num="category",
+    departure_icao="category",
+    arrival_icao="category",
+)
+
 
 def fetch(icaos, api_key, timezone="Europe/Berlin"):
     """
@@ -37,14 +62,137 @@ def fetch(icaos, api_key, timezone="Europe/Berlin"):
     flight_data : pd.DataFrame
         DataFrame containing the incoming flights for the next full day
         The columns are 'flight_num', 'departure_icao', 'arrival_icao',
-        'arrival_time', and 'flight_retrieved_at'
+        'arrival_time', and 'flight_retrieved_at'. To save memory, the
+        string columns are categorical. Codeshared flights are collapsed
+        into one row per operating flight
 
     Warns
     -----
     UserWarning
         If the API call fails for an ICAO code
     """
-    url_base = "https://aerodatabox.p.rapidapi.com/flights/airports/icao"
+    # Iterate over ICAOs and time slots to retrieve flight data
+    records = []
+    for icao in icaos:
+        for from_time, to_time in time_slots(tomorrow(timezone)):
+            data = fetch_window(icao, from_time, to_time, api_key)
+            if data is not None:
+                records.append(data)
+
+    # Categories are only shared after concatenation
+    flights, _ = collapse_codeshares(pd.concat(records, ignore_index=True))
+    flights = flights.astype(DTYPES)
+    return flights
+
+
+def backfill(icaos, api_key, start, end, completed=(), windows=None):
+    """
+    Fetch the incoming flights for a range of dates one unit at a time
+
+    A unit is a single ICAO code and time slot. Each unit is yielded as
+    soon as it is retrieved, so that the caller can store it before the
+    next request is made. The number of time slots per day can be set
+    per ICAO code, see `plan_windows`. Only the parts of the time slots
+    that are not covered by completed units are fetched, so that no
+    time is fetched twice or skipped, even if the number of time slots
+    differs from an earlier run.
+
+    Parameters
+    ----------
+    icaos : list
+        List of ICAO codes for the airports to fetch the incoming
+        flights
+
+    api_key : str
+        RapidAPI key to access the Aerodatabox API
+
+    start : str or datetime.date
+        First date of the range (inclusive)
+
+    end : str or datetime.date
+        Last date of the range (inclusive)
+
+    completed : iterable
+        Tuples (icao, slot_start, slot_end) of units that were already
+        retrieved and are skipped. The slot start and end are
+        pd.Timestamp
+
+    windows : dict, optional
+        Number of time slots per day for each ICAO code. By default, or
+        for ICAO codes not in the dictionary, the least number of time
+        slots possible is used
+
+    Yields
+    ------
+    icao : str
+        ICAO code of the unit
+
+    slot : tuple
+        Start and end of the time slot as pd.Timestamp
+
+    flight_data : pd.DataFrame
+        DataFrame containing the incoming flights of the unit with the
+        same columns as returned by `fetch`
+
+    codeshare_data : pd.DataFrame
+        DataFrame containing the marketing flight numbers of the
+        codeshared flights of the unit as returned by
+        `collapse_codeshares`
+
+    Warns
+    -----
+    UserWarning
+        If the API call fails for a unit. The unit is not yielded
+    """
+    windows = windows or dict()
+    completed_icao = dict()
+    for icao, slot_start, slot_end in completed:
+        completed_icao.setdefault(icao, []).append((slot_start, slot_end))
+
+    for date in pd.date_range(start, end, freq="D").date:
+        for icao in icaos:
+            for from_time, to_time in time_slots(date, windows.get(icao, plan_windows(0))):
+                planned = pd.Timestamp(from_time), pd.Timestamp(to_time)
+                for slot in uncovered(planned, completed_icao.get(icao, [])):
+                    slot_from, slot_to = (f"{time:%Y-%m-%dT%H:%M}" for time in slot)
+                    data = fetch_window(icao, slot_from, slot_to, api_key)
+                    if data is not None:
+                        data, codeshares = collapse_codeshares(data)
+                        yield icao, slot, data.astype(DTYPES), codeshares
+
+
+def fetch_slot(icao, from_time, to_time, api_key):
+    """
+    Fetch the incoming flights of one airport within one time slot
+
+    Parameters
+    ----------
+    icao : str
+        ICAO code of the airport
+
+    from_time : str
+        Local start time of the slot in the format 'YYYY-MM-DDTHH:MM'
+
+    to_time : str
+        Local end time of the slot in the format 'YYYY-MM-DDTHH:MM'. The
+        slot may not span more than 12 hours
+
+    api_key : str
+        RapidAPI key to access the Aerodatabox API
+
+    Returns
+    -------
+    flight_data : pd.DataFrame or None
+        DataFrame containing the incoming flights with the same columns
+        as returned by `fetch` and the additional columns
+        'arrival_time_local' and 'codeshare_status', or None if the API
+        call failed. Codeshared flights are not collapsed yet
+
+    Warns
+    -----
+    UserWarning
+        If the API call fails
+    """
     headers = {
         "x-rapidapi-key": api_key,
         "x-rapidapi-host": "aerodatabox.p.rapidapi.com",
@@ -59,44 +207,236 @@ def fetch(icaos, api_key, timezone="Europe/Berlin"):
         withLocation="false",
     )
 
-    # Construct two time intervals to cover the full day of tomorrow
-    timezone_local = tz(timezone)
-    today_local = datetime.now(timezone_local).date()
-    tomorrow = today_local + timedelta(days=1)
-    time_slot_1 = [f"{tomorrow}T00:00", f"{tomorrow}T11:59"]
-    time_slot_2 = [f"{tomorrow}T12:00", f"{tomorrow}T23:59"]
-
     # Define the columns to retrieve and their names
     columns = [
         "number",
         "departure.airport.icao",
         "arrival.scheduledTime.utc",
+        "arrival.scheduledTime.local",
+        "codeshareStatus",
     ]
     column_names = [
         "flight_num",
         "departure_icao",
         "arrival_icao",
         "arrival_time",
+        "arrival_time_local",
+        "codeshare_status",
         "flight_retrieved_at",
     ]
 
-    # Iterate over ICAOs and time slots to retrieve flight data
-    records = []
-    for icao in icaos:
-        for from_time, to_time in [time_slot_1, time_slot_2]:
-            url_icao = f"{url_base}/{icao}/{from_time}/{to_time}"
-            response = requests.get(url_icao, headers=headers, params=params)
-            if not response.ok or response.status_code != 200:
-                warnings.warn(f"Failed to fetch flights for '{icao}': {response.text}")
-                continue
-            data = pd.json_normalize(response.json()["arrivals"])[columns]
-            data.insert(2, "icao", icao)
-            data["flight_retrieved_at"] = response.headers["Date"]
-            data.columns = column_names
-            records.append(data)
+    url_icao = f"{URL_BASE}/{icao}/{from_time}/{to_time}"
+    response = requests.get(url_icao, headers=headers, params=params)
+    if not response.ok or response.status_code != 200:
+        warnings.warn(f"Failed to fetch flights for '{icao}': {response.text}")
+        return None
+
+    # Reindex to keep the columns for time slots without any arrivals
+    data = pd.json_normalize(response.json()["arrivals"]).reindex(columns=columns)
+    data.insert(2, "icao", icao)
+    data["flight_retrieved_at"] = response.headers["Date"]
+    data.columns = column_names
 
     # Format data types
-    flights = pd.concat(records, ignore_index=True)
-    flights.arrival_time = pd.to_datetime(flights.arrival_time, utc=True)
-    flights.flight_retrieved_at = pd.to_datetime(flights.flight_retrieved_at)
-    return flights
+    data.arrival_time = pd.to_datetime(data.arrival_time, utc=True)
+    local_time = data.arrival_time_local.astype("string").str[:16]
+    data.arrival_time_local = pd.to_datetime(local_time)
+    data.flight_retrieved_at = pd.to_datetime(data.flight_retrieved_at)
+    return data
+
+
+def fetch_window(icao, from_time, to_time, api_key):
+    """
+    Fetch the incoming flights of one airport within one time window
+
+    If the response contains as many arrivals as may be returned at
+    most, it is assumed to hold the earliest arrivals of the window. Its
+    arrivals before the last arrival time are kept and the remainder of
+    the window is fetched with further requests.
+
+    Parameters
+    ----------
+    icao : str
+        ICAO code of the airport
+
+    from_time : str
+        Local start time of the window in the format 'YYYY-MM-DDTHH:MM'
+
+    to_time : str
+        Local end time of the window in the format 'YYYY-MM-DDTHH:MM'
+
+    api_key : str
+        RapidAPI key to access the Aerodatabox API
+
+    Returns
+    -------
+    flight_data : pd.DataFrame or None
+        DataFrame as returned by `fetch_slot`, or None if any of the API
+        calls failed
+
+    Warns
+    -----
+    UserWarning
+        If an API call fails
+    """
+    data = fetch_slot(icao, from_time, to_time, api_key)
+    if data is None or len(data) < MAX_ARRIVALS:
+        return data
+
+    # The arrivals at the last (local) minute may be incomplete. If all
+    # arrivals are at the first minute, the window cannot be narrowed
+    last = data.arrival_time_local.max()
+    if pd.isna(last) or last <= pd.Timestamp(from_time):
+        return data
+
+    remainder = fetch_window(icao, f"{last:%Y-%m-%dT%H:%M}", to_time, api_key)
+    if remainder is None:
+        return None
+    complete = data[data.arrival_time_local < last]
+    return pd.concat([complete, remainder], ignore_index=True)
+
+
+def collapse_codeshares(flights):
+    """
+    Collapse codeshared flights into one row per operating flight
+
+    Flights with the same departure airport, arrival airport, and
+    arrival time are considered one physical flight. The flight number
+    of the operating airline is kept, or the first one listed if the
+    operator is unknown. Flights with unknown departure airport are
+    never collapsed.
+
+    Parameters
+    ----------
+    flights : pd.DataFrame
+        DataFrame as returned by `fetch_slot`
+
+    Returns
+    -------
+    flight_data : pd.DataFrame
+        DataFrame containing the operating flights with the same columns
+        as returned by `fetch`
+
+    codeshare_data : pd.DataFrame
+        DataFrame containing the remaining marketing flight numbers with
+        the columns 'flight_num', 'departure_icao', 'arrival_icao', and
+        'arrival_time'
+    """
+    key = ["departure_icao", "arrival_icao", "arrival_time"]
+
+    # Move the operating flight numbers to the front of each group
+    is_marketing = flights.codeshare_status.ne("IsOperator")
+    ordered = flights.assign(is_marketing=is_marketing)
+    ordered = ordered.sort_values("is_marketing", kind="stable")
+    duplicated = ordered.duplicated(subset=key) & ordered.departure_icao.notna()
+
+    flight_data = ordered[~duplicated].sort_index()
+    flight_data = flight_data.drop(
+        columns=["arrival_time_local", "codeshare_status", "is_marketing"]
+    )
+    codeshare_data = ordered.loc[duplicated, ["flight_num"] + key].sort_index()
+    return flight_data, codeshare_data
+
+
+def plan_windows(arrivals_per_day):
+    """
+    Get the number of time windows to cover a day with as few requests
+    as possible
+
+    Parameters
+    ----------
+    arrivals_per_day : float
+        Expected number of arrivals per day at the airport, including
+        codeshared flights
+
+    Returns
+    -------
+    windows : int
+        Number of time windows. This is a divisor of 24, so that the
+        windows span full hours
+    """
+    needed = max(24 / MAX_WINDOW_HOURS, arrivals_per_day / MAX_ARRIVALS)
+    return next(n for n in (2, 3, 4, 6, 8, 12, 24) if n >= needed or n == 24)
+
+
+def time_slots(date, windows=2):
+    """
+    Construct time intervals of equal length to cover a full day
+
+    Parameters
+    ----------
+    date : datetime.date
+        Date to cover
+
+    windows : int
+        Number of time intervals. Must be a divisor of 1440, the number
+        of minutes of a day. Default is 2
+
+    Returns
+    -------
+    slots : list
+        List of [from_time, to_time] pairs of local time strings
+    """
+    day_start = pd.Timestamp(date)
+    length = pd.Timedelta(days=1) / windows
+    slots = []
+    for i in range(windows):
+        from_time = day_start + i * length
+        to_time = from_time + length - pd.Timedelta(minutes=1)
+        slots.append([f"{from_time:%Y-%m-%dT%H:%M}", f"{to_time:%Y-%m-%dT%H:%M}"])
+    return slots
+
+
+def uncovered(slot, completed):
+    """
+    Get the parts of a time slot that are not covered by other time
+    slots
+
+    Parameters
+    ----------
+    slot : tuple
+        Start and end of the time slot as pd.Timestamp. The end is the
+        last minute of the slot
+
+    completed : list
+        List of tuples with the start and end of the covering time slots
+
+    Returns
+    -------
+    slots : list
+        List of tuples with the start and end of the uncovered parts
+    """
+    start, end = slot
+    minute = pd.Timedelta(minutes=1)
+    slots = []
+    for done_start, done_end in sorted(completed):
+        if done_end < start or done_start > end:
+            continue
+        if done_start > start:
+            slots.append((start, done_start - minute))
+        start = max(start, done_end + minute)
+        if start > end:
+            break
+    if start <= end:
+        slots.append((start, end))
+    return slots
+
+
+def tomorrow(timezone="Europe/Berlin"):
+    """
+    Get the date of the following day
+
+    Parameters
+    ----------
+    timezone : str
+        IANA timezone string to determine the date of the following day
+        from now. Default is 'Europe/Berlin'
+
+    Returns
+    -------
+    date : datetime.date
+        Date of the following day in the given timezone
+    """
+    timezone_local = tz(timezone)
+    today_local = datetime.now(timezone_local).date()
+    return today_local + timedelta(days=1)
@@ -10,6 +10,17 @@ import warnings
 import pandas as pd
 import requests
 
+# Compact data types of the forecast columns
+DTYPES = dict(
+    id="int32",
+    outlook="category",
+    temperature="float32",
+    feels_like="float32",
+    wind_speed="float32",
+    rain_prob="float32",
+    rain_in_last_3h="float32",
+)
+
 
 def forecast(latitudes, longitudes, api_key):
     """
@@ -48,7 +59,8 @@ def forecast(latitudes, longitudes, api_key):
     -----
     The columns are 'id', 'forecast_time', 'outlook', 'temperature',
     'feels_like', 'wind_speed', 'rain_prob', 'rain_in_last_3h', and
-    'weather_retrieved_at'. All timestamps are in UTC.
+    'weather_retrieved_at'. All timestamps are in UTC. To save memory,
+    'outlook' is categorical and the numerical columns are 32-bit.
     """
     if len(latitudes) != len(longitudes):
         raise ValueError("latitudes and longitudes must have the same length")
@@ -83,4 +95,5 @@ def forecast(latitudes, longitudes, api_key):
     weather = pd.DataFrame(records)
     weather.forecast_time = pd.to_datetime(weather.forecast_time, unit="s")
     weather.weather_retrieved_at = pd.to_datetime(weather.weather_retrieved_at)
+    weather = weather.astype(DTYPES)
     return weather